@@ -2,20 +2,36 @@ import os
 import time
 import logging
 import sys
-from datetime import datetime
-from flask import Flask, render_template, request, jsonify, session
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timedelta
+from flask import Flask, Request, Response, abort, render_template, request, jsonify, session, stream_with_context, url_for
+from flask.json.provider import JSONProvider
+from flask_session import Session
 from flask_sqlalchemy import SQLAlchemy
+import redis
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
-from utils.openai_helper import process_audio, generate_response, text_to_speech
-import asyncio
-
-# Enhanced logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    stream=sys.stdout
+import sqlite3
+from tempfile import SpooledTemporaryFile
+from utils.openai_helper import (
+    process_audio, generate_response, generate_spoken_response, text_to_speech, embed_text,
+    stream_response, iter_sentences, audio_data_url, audio_digest, warm_up, close_clients, chat_model
+)
+from utils.llm_cache import MemoryBackend, create_backend, cache_key as llm_cache_key, turn_key, DEFAULT_TTL
+from utils.async_runner import run_async, submit_async
+from utils.semantic_cache import (
+    SemanticCache, DEFAULT_MAX_ENTRIES, DEFAULT_THRESHOLD, context_key, normalize_embedding
 )
+from utils.tts_store import TTSObjectStore
+from utils.audio_clips import AudioClipStore, DEFAULT_CLIP_TTL
+from utils.batch_jobs import MAX_BATCH_LINES, embedding_line, submit_batch, wait_for_batch, iter_batch_results
+import asyncio
+import orjson
+import click
+from urllib.parse import quote
 
 # Add request_id filter
 class RequestIDFilter(logging.Filter):
@@ -23,101 +39,366 @@ class RequestIDFilter(logging.Filter):
         record.request_id = getattr(record, 'request_id', 'N/A')
         return True
 
+# Enhanced logging configuration. Records are handed to a queue and written to
+# stdout by a listener thread, so request threads never block on a slow stream.
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter(
+    '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+))
+_log_handler.addFilter(RequestIDFilter())
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, _log_handler, respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# The queue handler passes the bare message on; _log_handler applies the real
+# format in the listener thread. Without its own formatter, basicConfig would
+# give it BASIC_FORMAT and every line would be formatted twice.
+_queue_handler = QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))
+
+# force=True replaces any handler a library installed on the root logger at import time.
+logging.basicConfig(level=logging.INFO, handlers=[_queue_handler], force=True)
+
 logger = logging.getLogger(__name__)
 logger.addFilter(RequestIDFilter())
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+@event.listens_for(Engine, "connect")
+def _configure_sqlite(dbapi_connection, connection_record):
+    """Use WAL so concurrent request threads don't serialize on the sqlite writer lock."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.execute("PRAGMA cache_size=-64000")
+    cursor.close()
+
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
+# Proxies commonly cap response headers at 4-8KB in total, so replies whose
+# percent-encoded texts exceed this are sent as JSON instead.
+MAX_TEXT_HEADER_SIZE = 4096
+
+class AudioRequest(Request):
+    """Keep uploads up to MAX_UPLOAD_SIZE in memory.
+
+    Werkzeug spools file parts over 500KB to a temporary file on disk; a
+    voice clip is read back once to send to Whisper, so that round-trip is
+    pure overhead.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=MAX_UPLOAD_SIZE, mode='rb+')
+
+class OrjsonProvider(JSONProvider):
+    """Serve jsonify() and the session cookie through orjson."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
 
 class Base(DeclarativeBase):
     pass
 
 db = SQLAlchemy(model_class=Base)
 app = Flask(__name__)
+app.request_class = AudioRequest
+app.json = OrjsonProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY") or "a secret key"
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///chat.db"
 app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
     "pool_recycle": 300,
     "pool_pre_ping": True,
+    "query_cache_size": 1200,
 }
 db.init_app(app)
 
+# Keep chat history server-side when Redis is available so only a session id
+# cookie travels with each request instead of the signed transcript.
+REDIS_URL = os.environ.get("REDIS_URL")
+redis_client = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+if redis_client is not None:
+    app.config.update(
+        SESSION_TYPE="redis",
+        SESSION_REDIS=redis_client,
+        SESSION_SERIALIZATION_FORMAT="msgpack",
+        PERMANENT_SESSION_LIFETIME=timedelta(hours=1),
+    )
+    Session(app)
+
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+llm_cache = create_backend(os.environ.get("LLM_CACHE_BACKEND", "memory"))
+LLM_CACHE_TTL = int(os.environ.get("LLM_CACHE_TTL", DEFAULT_TTL))
+# Whole turns keyed by upload content and pre-turn history; process-local,
+# since a retry normally lands on the worker that served the first attempt.
+turn_cache = MemoryBackend(maxsize=int(os.environ.get("TURN_CACHE_SIZE", 128)))
+
+TTS_BUCKET = os.environ.get("TTS_BUCKET")
+tts_store = TTSObjectStore(
+    TTS_BUCKET,
+    url_ttl=int(os.environ.get("TTS_URL_TTL", 3600)),
+    endpoint_url=os.environ.get("TTS_S3_ENDPOINT_URL")
+) if TTS_BUCKET else None
+
+# Streamed sentences reference their audio by URL when a shared clip store is
+# available; otherwise it is inlined as a base64 data URL.
+audio_clips = AudioClipStore(
+    redis_client,
+    ttl=int(os.environ.get("TTS_CLIP_TTL", DEFAULT_CLIP_TTL))
+) if redis_client is not None else None
+
+semantic_cache = SemanticCache(
+    threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+    max_entries=int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+)
+
+def _save_conversation(category, user_message, bot_response):
+    from models import Conversation
+
+    try:
+        db.session.add(Conversation(
+            category=category,
+            user_message=user_message,
+            bot_response=bot_response
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Failed to persist conversation turn: %s", e)
+
+async def persist_history(category, user_message, bot_response):
+    """Record a conversation turn without blocking the event loop."""
+    await asyncio.to_thread(_save_conversation, category, user_message, bot_response)
+
+def synthesize_reply(text, voice_model):
+    """Return a coroutine producing the reply audio: MP3 bytes, or a URL when TTS_BUCKET is set."""
+    if tts_store is not None:
+        return tts_store.speech_url(text, voice_model, text_to_speech)
+    return text_to_speech(text, voice_model)
+
+async def speak_and_persist(category, user_message, bot_response, voice_model):
+    """Synthesize the reply while the turn is logged to the database.
+
+    persist_history goes first so its DB write is already running in a worker
+    thread before TTS takes over the event loop.
+    """
+    _, audio = await asyncio.gather(
+        persist_history(category, user_message, bot_response),
+        synthesize_reply(bot_response, voice_model)
+    )
+    return audio
+
+def _start_pending_reply(category, user_message):
+    """Record a turn whose reply will be streamed, and remember it in the session.
+
+    A streamed response cannot update the cookie session once its headers
+    are sent, so the reply lands in the Conversation row instead and
+    load_history() folds it into the history on the next request.
+    """
+    from models import Conversation
+
+    turn = Conversation(category=category, user_message=user_message, bot_response='')
+    db.session.add(turn)
+    db.session.commit()
+    session['pending_reply_id'] = turn.id
+    session.pop('last_response_id', None)
+    session.pop('chained_turns', None)
+    return turn.id
+
+def _complete_pending_reply(turn_id, bot_response):
+    from models import Conversation
+
+    try:
+        Conversation.query.filter_by(id=turn_id).update({Conversation.bot_response: bot_response})
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Failed to store streamed reply: %s", e)
+
+def _discard_pending_reply(turn_id):
+    """Drop the row of a streamed reply that failed or was aborted before it finished."""
+    from models import Conversation
+
+    try:
+        Conversation.query.filter_by(id=turn_id).delete()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning("Failed to discard unfinished streamed reply: %s", e)
+
+# Continuing a stored response bills every earlier turn in the chain again as
+# input, so after this many turns the chain restarts from the session history,
+# which is capped at the last 10 messages.
+MAX_CHAINED_TURNS = 5
+
+def _previous_response_id():
+    """Return the stored response to continue, or None to restart from the history."""
+    if session.get('chained_turns', 0) >= MAX_CHAINED_TURNS:
+        return None
+    return session.get('last_response_id')
+
+def _record_response_id(previous_id, response_id):
+    """Remember ``response_id`` for the next turn and how long its chain has grown."""
+    session['last_response_id'] = response_id
+    if response_id is None:
+        session['chained_turns'] = 0
+    elif previous_id is None:
+        session['chained_turns'] = 1
+    else:
+        session['chained_turns'] = session.get('chained_turns', 0) + 1
+
+def load_history():
+    """Return the session chat history, including any reply finished by a streamed request."""
+    from models import Conversation
+
+    history = session.get('chat_history', [])
+    pending_id = session.pop('pending_reply_id', None)
+    if pending_id is not None:
+        turn = db.session.get(Conversation, pending_id)
+        if turn is not None and turn.bot_response:
+            history = [
+                *history,
+                {'role': 'user', 'content': turn.user_message},
+                {'role': 'assistant', 'content': turn.bot_response}
+            ][-10:]
+            session['chat_history'] = history
+    return history
+
+_STREAM_END = object()
+
+async def speak_sentences(sentences, voice_model, clips):
+    """Synthesize each sentence as GPT finishes it and put ``(sentence, audio)`` on ``clips`` in order.
+
+    GPT is read by its own task, so a clip is handed over as soon as its TTS
+    is done rather than when the next sentence arrives. ``clips`` is a
+    thread-safe queue read by the streaming response; it ends with
+    _STREAM_END, or with the exception that stopped the reply.
+    """
+    speeches = asyncio.Queue()
+    
+    async def read_sentences():
+        try:
+            async for sentence in sentences:
+                await speeches.put((sentence, asyncio.create_task(text_to_speech(sentence, voice_model))))
+        finally:
+            speeches.put_nowait(None)
+    
+    reader = asyncio.create_task(read_sentences())
+    try:
+        while (item := await speeches.get()) is not None:
+            sentence, speech = item
+            clips.put((sentence, await speech))
+        await reader
+        clips.put(_STREAM_END)
+    except Exception as e:
+        clips.put(e)
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        while not speeches.empty():
+            item = speeches.get_nowait()
+            if item is not None:
+                item[1].cancel()
+        await sentences.aclose()
+
+def _ndjson(event):
+    return orjson.dumps(event) + b'\n'
+
+def _audio_ref(audio):
+    """Return a URL the browser can play ``audio`` from."""
+    if audio_clips is not None:
+        return url_for('tts_clip', uid=audio_clips.put(audio))
+    return audio_data_url(audio)
+
+def _validate_audio_upload(request_id):
+    """Return an error response for an unusable audio upload, or None if it is valid."""
+    if 'audio' not in request.files:
+        logger.error("No audio file in request", extra={'request_id': request_id})
+        return jsonify({'error': 'No audio file provided', 'request_id': request_id}), 400
+    
+    audio_file = request.files['audio']
+    if not audio_file:
+        logger.error("Empty audio file received", extra={'request_id': request_id})
+        return jsonify({'error': 'Empty audio file', 'request_id': request_id}), 400
+        
+    # Log file details
+    file_size = request.content_length
+    content_type = audio_file.content_type
+    logger.info("Audio file received - Size: %s bytes, Type: %s", file_size, content_type, 
+               extra={'request_id': request_id})
+    
+    # Validate file size
+    max_size = MAX_UPLOAD_SIZE
+    if file_size > max_size:
+        logger.error("File size (%s bytes) exceeds maximum allowed size (%s bytes)", file_size, max_size,
+                    extra={'request_id': request_id})
+        return jsonify({'error': 'File too large', 'request_id': request_id}), 400
+        
+    # Enhanced content type validation with codec support
+    allowed_types = {
+        'audio/wav': None,
+        'audio/x-wav': None,
+        'audio/wave': None,
+        'audio/webm': None
+    }
+    
+    # Parse content type and codec
+    content_parts = content_type.split(';')
+    base_type = content_parts[0].strip()
+    codec = None
+    
+    if len(content_parts) > 1:
+        codec_part = [p for p in content_parts[1:] if 'codecs=' in p]
+        if codec_part:
+            codec = codec_part[0].split('=')[1].strip('"')
+    
+    logger.info("Parsed content type - Base: %s, Codec: %s", base_type, codec,
+               extra={'request_id': request_id})
+    
+    if base_type not in allowed_types:
+        logger.error("Invalid base content type: %s", base_type,
+                    extra={'request_id': request_id})
+        return jsonify({
+            'error': f'Invalid audio format. Allowed types: {", ".join(allowed_types.keys())}',
+            'request_id': request_id
+        }), 400
+        
+    if codec and allowed_types[base_type] != codec:
+        logger.error("Invalid codec: %s for type %s", codec, base_type,
+                    extra={'request_id': request_id})
+        return jsonify({
+            'error': f'Invalid codec. Expected {allowed_types[base_type] or "none"} for {base_type}',
+            'request_id': request_id
+        }), 400
+    
+    return None
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/process-audio', methods=['POST'])
 def process_audio_route():
-    start_time = time.time()
-    request_id = f"req_{int(start_time * 1000)}"
+    start_time = time.monotonic()
+    request_id = f"req_{int(time.time() * 1000)}"
     logger.info("New audio processing request received", extra={'request_id': request_id})
     
     try:
         # Enhanced request validation logging
         logger.info("Starting request validation", extra={'request_id': request_id})
-        logger.info(f"Request headers: {dict(request.headers)}", extra={'request_id': request_id})
-        
-        if 'audio' not in request.files:
-            logger.error("No audio file in request", extra={'request_id': request_id})
-            return jsonify({'error': 'No audio file provided', 'request_id': request_id}), 400
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Request headers: %s", dict(request.headers), extra={'request_id': request_id})
         
+        error_response = _validate_audio_upload(request_id)
+        if error_response is not None:
+            return error_response
         audio_file = request.files['audio']
-        if not audio_file:
-            logger.error("Empty audio file received", extra={'request_id': request_id})
-            return jsonify({'error': 'Empty audio file', 'request_id': request_id}), 400
-            
-        # Log file details
-        file_size = request.content_length
-        content_type = audio_file.content_type
-        logger.info(f"Audio file received - Size: {file_size} bytes, Type: {content_type}", 
-                   extra={'request_id': request_id})
-        
-        # Validate file size
-        max_size = 10 * 1024 * 1024  # 10MB
-        if file_size > max_size:
-            logger.error(f"File size ({file_size} bytes) exceeds maximum allowed size ({max_size} bytes)",
-                        extra={'request_id': request_id})
-            return jsonify({'error': 'File too large', 'request_id': request_id}), 400
-            
-        # Enhanced content type validation with codec support
-        allowed_types = {
-            'audio/wav': None,
-            'audio/x-wav': None,
-            'audio/wave': None,
-            'audio/webm': None
-        }
-        
-        # Parse content type and codec
-        content_parts = content_type.split(';')
-        base_type = content_parts[0].strip()
-        codec = None
-        
-        if len(content_parts) > 1:
-            codec_part = [p for p in content_parts[1:] if 'codecs=' in p]
-            if codec_part:
-                codec = codec_part[0].split('=')[1].strip('"')
-        
-        logger.info(f"Parsed content type - Base: {base_type}, Codec: {codec}",
-                   extra={'request_id': request_id})
-        
-        if base_type not in allowed_types:
-            logger.error(f"Invalid base content type: {base_type}",
-                        extra={'request_id': request_id})
-            return jsonify({
-                'error': f'Invalid audio format. Allowed types: {", ".join(allowed_types.keys())}',
-                'request_id': request_id
-            }), 400
-            
-        if codec and allowed_types[base_type] != codec:
-            logger.error(f"Invalid codec: {codec} for type {base_type}",
-                        extra={'request_id': request_id})
-            return jsonify({
-                'error': f'Invalid codec. Expected {allowed_types[base_type] or "none"} for {base_type}',
-                'request_id': request_id
-            }), 400
         
         # Enhanced request details logging
         category = request.form.get('category', 'general')
@@ -132,84 +413,297 @@ def process_audio_route():
         }
         logger.info("Received audio processing request", extra=request_details)
         
-        # Create event loop for async operations
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+        # Enhanced logging for audio processing steps
+        logger.info("Starting audio processing pipeline", extra={'request_id': request_id})
         
-        try:
-            # Enhanced logging for audio processing steps
-            logger.info("Starting audio processing pipeline", extra={'request_id': request_id})
-            
+        # Get conversation history from session
+        history = load_history()
+        logger.info("[%s] Retrieved conversation history: %s messages", request_id, len(history))
+        previous_id = _previous_response_id()
+        
+        # A repeated upload against the same history (a client retry, a duplicate
+        # clip) is answered from the turn cache without Whisper, GPT or TTS
+        audio_file.stream.seek(0)
+        reply_key = turn_key(audio_digest(audio_file.stream.read()), category, history, voice_model)
+        cached_turn = turn_cache.get(reply_key)
+        if cached_turn is not None:
+            logger.info("[%s] Serving repeated upload from turn cache", request_id)
+            text, response = cached_turn['text'], cached_turn['response']
+            audio_response, response_id = cached_turn['audio'], cached_turn['response_id']
+        else:
             # Process audio using Whisper API
-            transcription_start = time.time()
+            transcription_start = time.monotonic()
             logger.info("Initiating audio transcription", extra={'request_id': request_id})
             try:
-                text = loop.run_until_complete(process_audio(audio_file, OPENAI_API_KEY))
-                transcription_time = time.time() - transcription_start
-                logger.info(f"Audio transcription completed in {transcription_time:.2f}s - Text length: {len(text)} chars",
+                text = run_async(process_audio(audio_file, OPENAI_API_KEY))
+                transcription_time = time.monotonic() - transcription_start
+                logger.info("Audio transcription completed in %.2fs - Text length: %s chars", transcription_time, len(text),
                            extra={'request_id': request_id})
             except Exception as e:
-                logger.error(f"Audio transcription failed: {str(e)}", 
+                logger.error("Audio transcription failed: %s", e, 
                            extra={'request_id': request_id, 'error_type': type(e).__name__})
                 return jsonify({'error': f'Error processing audio: {str(e)}', 'request_id': request_id}), 500
             
-            # Get conversation history from session
-            history = session.get('chat_history', [])
-            logger.info(f"[{request_id}] Retrieved conversation history: {len(history)} messages")
+            # Only replies generated through the Responses API can be continued by id;
+            # a cached reply breaks the chain and the next turn resends the history.
+            response_id = None
             
-            # Generate response using GPT
-            gpt_start = time.time()
-            try:
-                response = loop.run_until_complete(generate_response(text, category, history, OPENAI_API_KEY))
-                logger.info(f"[{request_id}] GPT response generated in {time.time() - gpt_start:.2f}s")
-            except Exception as e:
-                logger.error(f"[{request_id}] GPT response generation failed: {str(e)}")
-                return jsonify({'error': f'Error generating response: {str(e)}'}), 500
+            # Identical prompts are answered straight from the exact-match cache
+            exact_key = None
+            cached = None
+            if category != 'general':
+                exact_key = llm_cache_key(chat_model(category), category, history, text, voice_model)
+                try:
+                    cached = llm_cache.get(exact_key)
+                except Exception as e:
+                    logger.warning("[%s] LLM cache lookup failed: %s", request_id, e)
             
-            # Convert to speech
-            tts_start = time.time()
-            try:
-                audio_response = loop.run_until_complete(text_to_speech(response, voice_model))
-                logger.info(f"[{request_id}] Text-to-speech completed in {time.time() - tts_start:.2f}s")
-            except Exception as e:
-                logger.error(f"[{request_id}] Text-to-speech conversion failed: {str(e)}")
-                return jsonify({'error': f'Error converting text to speech: {str(e)}'}), 500
-        finally:
-            loop.close()
+            if cached is not None:
+                logger.info("[%s] Serving response and audio from exact-match cache", request_id)
+                response, audio_response = cached['response'], cached['audio']
+                if audio_response:
+                    run_async(persist_history(category, text, response))
+                else:
+                    # Object-store mode caches only the text; the stored audio just needs a fresh URL
+                    audio_response = run_async(speak_and_persist(category, text, response, voice_model))
+            else:
+                # Look up a semantically equivalent earlier turn before paying for GPT
+                cache_key = context_key(category, history)
+                embedding = None
+                response = None
+                audio_response = None
+                try:
+                    embedding = run_async(embed_text(text, OPENAI_API_KEY))
+                    response = semantic_cache.lookup(embedding, cache_key)
+                except Exception as e:
+                    logger.warning("[%s] Semantic cache lookup failed: %s", request_id, e)
+            
+                if response is not None:
+                    logger.info("[%s] Serving response from semantic cache", request_id)
+                else:
+                    # Generate response using GPT
+                    gpt_start = time.monotonic()
+                    try:
+                        if tts_store is None:
+                            # Speech for each sentence is synthesized while GPT writes the next one
+                            response, response_id, audio_response = run_async(generate_spoken_response(
+                                text, category, history, OPENAI_API_KEY, previous_id,
+                                voice_model
+                            ))
+                            logger.info("[%s] GPT response and speech generated in %.2fs", request_id,
+                                        time.monotonic() - gpt_start)
+                        else:
+                            response, response_id = run_async(generate_response(
+                                text, category, history, OPENAI_API_KEY, previous_id
+                            ))
+                            logger.info("[%s] GPT response generated in %.2fs", request_id, time.monotonic() - gpt_start)
+                    except Exception as e:
+                        logger.error("[%s] GPT response generation failed: %s", request_id, e)
+                        return jsonify({'error': f'Error generating response: {str(e)}'}), 500
+                
+                    # Without an embedding the entry is stored for `flask warm-cache`
+                    try:
+                        semantic_cache.insert(embedding, cache_key, category, text, response)
+                    except Exception as e:
+                        logger.warning("[%s] Semantic cache insert failed: %s", request_id, e)
+            
+                if audio_response is not None:
+                    run_async(persist_history(category, text, response))
+                else:
+                    # Convert to speech while the turn is logged
+                    tts_start = time.monotonic()
+                    try:
+                        audio_response = run_async(speak_and_persist(category, text, response, voice_model))
+                        logger.info("[%s] Text-to-speech completed in %.2fs", request_id, time.monotonic() - tts_start)
+                    except Exception as e:
+                        logger.error("[%s] Text-to-speech conversion failed: %s", request_id, e)
+                        return jsonify({'error': f'Error converting text to speech: {str(e)}'}), 500
+                
+                if exact_key is not None:
+                    try:
+                        cached_audio = audio_response if isinstance(audio_response, bytes) else b''
+                        llm_cache.set(exact_key, {'response': response, 'audio': cached_audio}, ttl=LLM_CACHE_TTL)
+                    except Exception as e:
+                        logger.warning("[%s] LLM cache store failed: %s", request_id, e)
+            
+            if isinstance(audio_response, bytes):
+                turn_cache.set(reply_key, {
+                    'text': text,
+                    'response': response,
+                    'audio': audio_response,
+                    'response_id': response_id
+                }, ttl=LLM_CACHE_TTL)
         
         # Update conversation history
         history = session.get('chat_history', [])
         history.append({'role': 'user', 'content': text})
         history.append({'role': 'assistant', 'content': response})
         session['chat_history'] = history[-10:]  # Keep last 10 messages
+        _record_response_id(previous_id, response_id)
         
-        total_time = time.time() - start_time
-        logger.info(f"[{request_id}] Request completed successfully in {total_time:.2f}s")
+        total_time = time.monotonic() - start_time
+        logger.info("[%s] Request completed successfully in %.2fs", request_id, total_time)
         
-        return jsonify({
-            'text': text,
-            'response': response,
-            'audio': audio_response,
-            'processing_time': total_time
+        transcript_header, response_header = quote(text), quote(response)
+        if isinstance(audio_response, str) or len(transcript_header) + len(response_header) > MAX_TEXT_HEADER_SIZE:
+            # Presigned object-store URL, or texts too long for proxy header
+            # limits; the texts go in the body and the audio by reference
+            return jsonify({
+                'text': text,
+                'response': response,
+                'audio_url': audio_response if isinstance(audio_response, str) else _audio_ref(audio_response),
+                'processing_time': total_time
+            })
+        
+        # Send the MP3 as the body rather than base64 inside JSON; the texts
+        # travel in percent-encoded headers.
+        return Response(audio_response, mimetype='audio/mpeg', headers={
+            'Content-Length': str(len(audio_response)),
+            'X-Transcript': transcript_header,
+            'X-Response': response_header,
+            'X-Processing-Time': f'{total_time:.3f}'
         })
     except Exception as e:
-        logger.error(f"[{request_id}] Unexpected error: {str(e)}")
+        logger.error("[%s] Unexpected error: %s", request_id, e)
         return jsonify({
             'error': f'Unexpected error: {str(e)}',
             'request_id': request_id
         }), 500
 
-@app.route('/reset-session', methods=['POST'])
-def reset_session():
+@app.route('/process-audio-stream', methods=['POST'])
+def process_audio_stream_route():
+    """Stream the spoken reply sentence by sentence as newline-delimited JSON."""
+    start_time = time.monotonic()
+    request_id = f"req_{int(time.time() * 1000)}"
+    logger.info("New streaming audio request received", extra={'request_id': request_id})
+    
+    # Everything before the stream starts answers with JSON, which the client
+    # reads as the error of a failed request
     try:
-        session.clear()
-        return jsonify({'status': 'success'})
+        error_response = _validate_audio_upload(request_id)
+        if error_response is not None:
+            return error_response
+        audio_file = request.files['audio']
+        category = request.form.get('category', 'general')
+        voice_model = request.form.get('voice_model', 'default')
+        
+        try:
+            text = run_async(process_audio(audio_file, OPENAI_API_KEY))
+        except Exception as e:
+            logger.error("Audio transcription failed: %s", e,
+                        extra={'request_id': request_id, 'error_type': type(e).__name__})
+            return jsonify({'error': f'Error processing audio: {str(e)}', 'request_id': request_id}), 500
+        
+        history = load_history()
+        turn_id = _start_pending_reply(category, text)
     except Exception as e:
-        return jsonify({'error': f'Error resetting session: {str(e)}'}), 500
+        logger.error("[%s] Unexpected error: %s", request_id, e)
+        return jsonify({
+            'error': f'Unexpected error: {str(e)}',
+            'request_id': request_id
+        }), 500
+    
+    def generate():
+        sentences = iter_sentences(stream_response(text, category, history, OPENAI_API_KEY))
+        clips = queue.SimpleQueue()
+        pipeline = submit_async(speak_sentences(sentences, voice_model, clips))
+        completed = False
+        try:
+            yield _ndjson({'type': 'transcript', 'text': text, 'request_id': request_id})
+            
+            spoken = []
+            while (clip := clips.get()) is not _STREAM_END:
+                if isinstance(clip, Exception):
+                    raise clip
+                sentence, audio = clip
+                yield _ndjson({'type': 'audio', 'seq': len(spoken), 'text': sentence, 'audio': _audio_ref(audio)})
+                spoken.append(sentence)
+            
+            response = ' '.join(spoken)
+            _complete_pending_reply(turn_id, response)
+            completed = True
+            total_time = time.monotonic() - start_time
+            logger.info("[%s] Streamed %s sentences in %.2fs", request_id, len(spoken), total_time)
+            yield _ndjson({'type': 'done', 'response': response, 'processing_time': total_time})
+        except Exception as e:
+            logger.error("[%s] Streaming response failed: %s", request_id, e)
+            yield _ndjson({'type': 'error', 'error': f'Error streaming response: {str(e)}', 'request_id': request_id})
+        finally:
+            pipeline.cancel()
+            if not completed:
+                _discard_pending_reply(turn_id)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/tts/<uid>')
+def tts_clip(uid):
+    audio = audio_clips.get(uid) if audio_clips is not None else None
+    if audio is None:
+        abort(404)
+    return Response(audio, mimetype='audio/mpeg', headers={
+        'Content-Length': str(len(audio)),
+        'Cache-Control': 'private, max-age=%d' % audio_clips.ttl
+    })
+
+@app.route('/reset-session', methods=['POST'])
+def reset_session():
+    session.clear()
+    return '', 204
+
+@app.cli.command('warm-cache')
+@click.option('--poll-interval', default=60, show_default=True, help='Seconds between batch status checks.')
+def warm_cache_command(poll_interval):
+    """Embed semantic cache entries that are missing embeddings via the Batch API."""
+    from models import SemanticCacheEntry
+
+    pending = SemanticCacheEntry.query.filter(
+        SemanticCacheEntry.embedding.is_(None),
+        SemanticCacheEntry.text.isnot(None)
+    ).all()
+    if not pending:
+        click.echo("No semantic cache entries are missing embeddings.")
+        return
+
+    for start in range(0, len(pending), MAX_BATCH_LINES):
+        entries = {str(entry.id): entry for entry in pending[start:start + MAX_BATCH_LINES]}
+        batch_id = submit_batch(
+            [embedding_line(custom_id, entry.text) for custom_id, entry in entries.items()],
+            api_key=OPENAI_API_KEY
+        )
+        click.echo(f"Submitted batch {batch_id} with {len(entries)} entries, waiting for results...")
+
+        batch = wait_for_batch(batch_id, poll_interval=poll_interval, api_key=OPENAI_API_KEY)
+        if batch.status != 'completed':
+            click.echo(f"Batch {batch_id} ended with status {batch.status}; skipping.")
+            continue
+
+        embedded = 0
+        for custom_id, body in iter_batch_results(batch, api_key=OPENAI_API_KEY):
+            entry = entries.get(custom_id)
+            if entry is not None:
+                entry.embedding = normalize_embedding(body['data'][0]['embedding']).tobytes()
+                embedded += 1
+        db.session.commit()
+        click.echo(f"Stored {embedded} embeddings from batch {batch_id}.")
 
 with app.app_context():
     import models
     db.create_all()
+    semantic_cache.load()
+
+@atexit.register
+def _close_openai_clients():
+    try:
+        run_async(close_clients(), timeout=5)
+    except Exception as e:
+        logger.warning("Failed to close OpenAI clients: %s", e)
+
+# Establish the HTTP/2 connection to OpenAI now so the first request skips DNS and TLS
+if OPENAI_API_KEY:
+    try:
+        run_async(warm_up(OPENAI_API_KEY), timeout=10)
+    except Exception as e:
+        logger.warning("OpenAI connection warm-up failed: %s", e)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
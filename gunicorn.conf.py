@@ -0,0 +1,11 @@
+import os
+
+# Threaded workers keep one slow OpenAI round-trip from stalling every other
+# request in the same process. gevent monkey-patching is avoided because the
+# OpenAI calls run on the shared asyncio loop in utils.async_runner.
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+threads = int(os.environ.get("GUNICORN_THREADS", 16))
+timeout = 120
+keepalive = 5
@@ -7,3 +7,21 @@ class Conversation(db.Model):
     user_message = db.Column(db.Text, nullable=False)
     bot_response = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SemanticCacheEntry(db.Model):
+    __tablename__ = 'semantic_cache'
+    id = db.Column(db.Integer, primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    context_key = db.Column(db.String(64), nullable=False, index=True)
+    text = db.Column(db.Text)
+    embedding = db.Column(db.LargeBinary)
+    response = db.Column(db.Text, nullable=False)
+    ts = db.Column(db.DateTime, default=datetime.utcnow)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+
+class LLMCacheEntry(db.Model):
+    __tablename__ = 'llm_cache'
+    key = db.Column(db.String(64), primary_key=True)
+    response = db.Column(db.Text, nullable=False)
+    audio = db.Column(db.LargeBinary, nullable=False)
+    expires_at = db.Column(db.Integer, nullable=False, index=True)
@@ -291,7 +291,7 @@ class AudioHandler {
         this.isWaitingForResponse = false;
     }
 
-    async playAudio(audioDataUrl) {
+    async playAudio(audioDataUrl, resumeRecording = true) {
         try {
             const audio = new Audio(audioDataUrl);
 
@@ -301,7 +301,7 @@ class AudioHandler {
                         await audio.play();
                         this.isWaitingForResponse = false;
 
-                        if (this.isContinuousMode) {
+                        if (resumeRecording && this.isContinuousMode) {
                             await this.startRecording(true);
                         }
                     } catch (error) {
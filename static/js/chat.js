@@ -18,6 +18,7 @@
                 recordButton: document.getElementById('recordButton'),
                 backButton: document.getElementById('backButton'),
                 voiceModel: document.getElementById('voiceModel'),
+                streamReplies: document.getElementById('streamReplies'),
                 historyButton: document.getElementById('historyButton'),
                 resetButton: document.getElementById('resetButton'),
                 exportButton: document.getElementById('exportButton'),
@@ -316,6 +317,11 @@
                 formData.append('category', this.currentCategory);
                 formData.append('voice_model', this.elements.voiceModel.value);
 
+                if (this.elements.streamReplies.checked) {
+                    await this.processAudioStream(formData);
+                    return;
+                }
+
                 const response = await fetch('/process-audio', {
                     method: 'POST',
                     body: formData
@@ -326,14 +332,32 @@
                     throw new Error(errorData.error || 'Failed to process audio');
                 }
 
-                const data = await response.json();
+                // JSON carries a URL to stored audio; otherwise the body is the
+                // MP3 reply and the texts come in headers
+                if ((response.headers.get('Content-Type') || '').includes('application/json')) {
+                    const data = await response.json();
 
-                // Add messages to chat
-                this.addMessage(data.text, 'user');
-                this.addMessage(data.response, 'bot');
+                    this.addMessage(data.text, 'user');
+                    this.addMessage(data.response, 'bot');
+
+                    await this.audioHandler.playAudio(data.audio_url);
+                } else {
+                    const replyBlob = await response.blob();
+                    const transcript = decodeURIComponent(response.headers.get('X-Transcript') || '');
+                    const reply = decodeURIComponent(response.headers.get('X-Response') || '');
 
-                // Play audio response
-                await this.audioHandler.playAudio(data.audio);
+                    // Add messages to chat
+                    this.addMessage(transcript, 'user');
+                    this.addMessage(reply, 'bot');
+
+                    // Play audio response
+                    const audioUrl = URL.createObjectURL(replyBlob);
+                    try {
+                        await this.audioHandler.playAudio(audioUrl);
+                    } finally {
+                        URL.revokeObjectURL(audioUrl);
+                    }
+                }
 
             } catch (error) {
                 console.error('[ChatInterface] Error processing audio:', error);
@@ -350,6 +374,56 @@
             }
         }
     
+        async processAudioStream(formData) {
+            const response = await fetch('/process-audio-stream', {
+                method: 'POST',
+                body: formData
+            });
+
+            if (!response.ok) {
+                const errorData = await response.json();
+                throw new Error(errorData.error || 'Failed to process audio');
+            }
+
+            // The body is newline-delimited JSON events; each sentence's clip is
+            // chained onto the previous one so playback starts with the first
+            // sentence while the rest are still being generated
+            const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+            let playback = Promise.resolve();
+            let buffer = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) {
+                    break;
+                }
+
+                buffer += value;
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+
+                for (const line of lines.filter(line => line.trim())) {
+                    const event = JSON.parse(line);
+
+                    if (event.type === 'transcript') {
+                        this.addMessage(event.text, 'user');
+                    } else if (event.type === 'audio') {
+                        playback = playback.then(() => this.audioHandler.playAudio(event.audio, false));
+                    } else if (event.type === 'done') {
+                        this.addMessage(event.response, 'bot');
+                    } else if (event.type === 'error') {
+                        throw new Error(event.error);
+                    }
+                }
+            }
+
+            await playback;
+
+            if (this.audioHandler.isContinuousMode) {
+                await this.audioHandler.startRecording(true);
+            }
+        }
+    
         addMessage(text, sender) {
             const messageDiv = document.createElement('div');
             messageDiv.className = `message ${sender}-message`;
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+import threading
+
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_lock = threading.Lock()
+
+def get_loop():
+    """Return the process-wide background event loop, starting it on first use."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name='async-runner', daemon=True)
+            thread.start()
+            _loop = loop
+            logger.info("Background event loop started (%s)", type(loop).__module__)
+    return _loop
+
+def run_async(coro, timeout=None):
+    """Run a coroutine on the background loop and block until it finishes.
+
+    The caller's contextvars (and so Flask's app and request context) are
+    carried over to the task, so helpers can still use ``session`` and
+    ``db.session``.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+def submit_async(coro):
+    """Schedule a coroutine on the background loop and return its concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
@@ -0,0 +1,29 @@
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CLIP_TTL = 300
+
+class AudioClipStore:
+    """Short-lived MP3 clips in Redis, served by ``/tts/<uid>``.
+
+    Lets text-only transports such as the NDJSON stream reference audio by
+    URL instead of inlining it as base64. Redis is used so any worker can
+    serve a clip another worker synthesized.
+    """
+
+    def __init__(self, client, prefix='tts-clip:', ttl=DEFAULT_CLIP_TTL):
+        self._redis = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def put(self, audio):
+        """Store a clip and return its id."""
+        uid = uuid.uuid4().hex
+        self._redis.set(self.prefix + uid, audio, ex=self.ttl)
+        return uid
+
+    def get(self, uid):
+        """Return the clip's MP3 bytes, or None once it has expired."""
+        return self._redis.get(self.prefix + uid)
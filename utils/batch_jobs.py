@@ -0,0 +1,65 @@
+import json
+import logging
+import os
+import time
+
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+# Background jobs only; these never run on the /process-audio path.
+MAX_BATCH_LINES = 10000
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+def _client(api_key=None):
+    return OpenAI(api_key=api_key or os.environ.get('OPENAI_API_KEY'))
+
+def embedding_line(custom_id, text, model="text-embedding-3-small"):
+    """Build one Batch API request line for an embedding."""
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': '/v1/embeddings',
+        'body': {'model': model, 'input': text}
+    }
+
+def submit_batch(lines, endpoint='/v1/embeddings', api_key=None):
+    """Upload request lines as JSONL and start a batch. Returns the batch id."""
+    if len(lines) > MAX_BATCH_LINES:
+        raise ValueError(f"Batch has {len(lines)} lines; the maximum is {MAX_BATCH_LINES}")
+
+    client = _client(api_key)
+    payload = '\n'.join(json.dumps(line) for line in lines).encode()
+    batch_file = client.files.create(file=('batch.jsonl', payload), purpose='batch')
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=endpoint,
+        completion_window='24h'
+    )
+    logger.info("Submitted batch %s with %s requests", batch.id, len(lines))
+    return batch.id
+
+def wait_for_batch(batch_id, poll_interval=60, api_key=None):
+    """Poll a batch until it reaches a terminal status and return it."""
+    client = _client(api_key)
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in TERMINAL_STATUSES:
+            logger.info("Batch %s finished with status %s", batch_id, batch.status)
+            return batch
+        time.sleep(poll_interval)
+
+def iter_batch_results(batch, api_key=None):
+    """Yield (custom_id, response_body) for each successful request in a batch."""
+    if not batch.output_file_id:
+        return
+    content = _client(api_key).files.content(batch.output_file_id).text
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        response = result.get('response') or {}
+        if result.get('error') or response.get('status_code') != 200:
+            logger.warning("Batch request %s failed: %s", result.get('custom_id'), result.get('error'))
+            continue
+        yield result['custom_id'], response['body']
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 3600
+HISTORY_WINDOW = 6
+
+def cache_key(model, category, history, text, voice_model):
+    """Build a deterministic key for an exact (prompt, voice) combination."""
+    payload = {
+        'model': model,
+        'category': category,
+        'history': history[-HISTORY_WINDOW:],
+        'text': text,
+        'voice_model': voice_model
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def turn_key(audio_digest, category, history, voice_model):
+    """Build a key for a whole spoken turn: the uploaded audio and the full history before it."""
+    payload = {
+        'audio': audio_digest,
+        'category': category,
+        'history': history,
+        'voice_model': voice_model
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+class CacheBackend(Protocol):
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    def set(self, key: str, value: dict, ttl: int = DEFAULT_TTL) -> None:
+        ...
+
+class MemoryBackend:
+    """Process-local LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+class SqliteBackend:
+    """Cache stored in the llm_cache table. Requires an app context.
+
+    Expired rows are purged on every write, and once the table holds more
+    than ``maxsize`` rows the ones closest to expiry are dropped.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+
+    def get(self, key):
+        from app import db
+        from models import LLMCacheEntry
+
+        entry = db.session.get(LLMCacheEntry, key)
+        if entry is None:
+            return None
+        if entry.expires_at <= int(time.time()):
+            db.session.delete(entry)
+            db.session.commit()
+            return None
+        return {'response': entry.response, 'audio': entry.audio}
+
+    def set(self, key, value, ttl=DEFAULT_TTL):
+        from app import db
+        from models import LLMCacheEntry
+
+        now = int(time.time())
+        LLMCacheEntry.query.filter(LLMCacheEntry.expires_at <= now).delete(synchronize_session=False)
+        db.session.merge(LLMCacheEntry(
+            key=key,
+            response=value['response'],
+            audio=value['audio'],
+            expires_at=now + ttl
+        ))
+        db.session.flush()
+        overflow = LLMCacheEntry.query.count() - self.maxsize
+        if overflow > 0:
+            oldest = db.select(LLMCacheEntry.key).order_by(LLMCacheEntry.expires_at).limit(overflow)
+            LLMCacheEntry.query.filter(LLMCacheEntry.key.in_(oldest)).delete(synchronize_session=False)
+        db.session.commit()
+
+def create_backend(name, maxsize=512):
+    """Return the cache backend registered under ``name``."""
+    if name == 'sqlite':
+        return SqliteBackend(maxsize=maxsize)
+    if name == 'memory':
+        return MemoryBackend(maxsize=maxsize)
+    raise ValueError(f"Unknown LLM cache backend: {name}")
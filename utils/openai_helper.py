@@ -1,77 +1,218 @@
-from openai import OpenAI
-import base64
-import tempfile
+from openai import (
+    APIConnectionError, AsyncOpenAI, DefaultAioHttpClient, InternalServerError, NotFoundError, RateLimitError
+)
+import hashlib
+try:
+    import pybase64 as base64  # SIMD-accelerated, same API as the stdlib module
+except ImportError:
+    import base64
+import aiohttp
+import edge_tts
+import httpx
+import asyncio
+import gtts.tts
 import requests
-from gtts import gTTS
+from gtts import gTTS, gTTSError
+from requests.adapters import HTTPAdapter
 import io
 import time
+from contextlib import aclosing
 from functools import wraps
+from types import MappingProxyType
 import os
+import random
 import logging
-from datetime import datetime
+import re
+from utils.llm_cache import MemoryBackend
+from utils.local_whisper import LocalWhisper
+
+__all__ = [
+    'CHAT_MODEL', 'STATIC_SYSTEM_PREFIX', 'SYSTEM_MESSAGES', 'get_client', 'close_clients', 'warm_up',
+    'retry_on_exception', 'validate_audio_format', 'process_audio', 'process_audio_array', 'chat_model', 'system_prompt',
+    'build_messages', 'generate_response', 'generate_responses_batch', 'generate_spoken_response', 'stream_response', 'iter_sentences',
+    'audio_data_url', 'text_to_speech', 'embed_text', 'audio_digest'
+]
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Short coaching replies don't need a frontier model; a mini model answers
+# several times faster. CHAT_MODEL_<CATEGORY> overrides it per category.
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "gpt-4o-mini")
+
+_SENTENCE_END = re.compile(r'[.?!]\s')
+
+# Per-call transport settings for the shared client; the SDK's own retries
+# cover connection resets before retry_on_exception sees a failure.
+OPENAI_MAX_RETRIES = 2
+OPENAI_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+# Whisper uploads run up to MAX_UPLOAD_SIZE (10MB) and take longer to send
+# and transcribe than a chat reply, so they get their own budget.
+TRANSCRIPTION_TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+
+# Caps in-flight OpenAI requests per process so a burst of uploads queues
+# here instead of fanning out into 429s and retry storms. Size it to the
+# account's rate-limit tier.
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", 20))
+_api_slots = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+# "aiohttp" swaps httpx's transport for the SDK's aiohttp one, which holds up
+# better at high concurrency; it speaks HTTP/1.1 only.
+OPENAI_HTTP_BACKEND = os.environ.get("OPENAI_HTTP_BACKEND", "httpx")
+
+_clients = {}
+
+# WHISPER_BACKEND=local transcribes with a self-hosted faster-whisper model
+# instead of the Whisper API.
+_local_whisper = LocalWhisper(
+    model_name=os.environ.get("LOCAL_WHISPER_MODEL", "large-v3-turbo"),
+    device=os.environ.get("LOCAL_WHISPER_DEVICE", "auto"),
+    compute_type=os.environ.get("LOCAL_WHISPER_COMPUTE_TYPE", "auto")
+) if os.environ.get("WHISPER_BACKEND") == "local" else None
+
+# Transcripts keyed by a hash of the uploaded audio, so a retried or
+# duplicate upload skips Whisper. The exact-match reply cache then serves
+# the GPT and TTS stages for the same transcript.
+_transcripts = MemoryBackend(maxsize=256)
+TRANSCRIPT_TTL = 3600
+
+# Audio for recently spoken sentences. Replies are synthesized sentence by
+# sentence, so greetings and stock phrases recur across users.
+_speech = MemoryBackend(maxsize=512)
+SPEECH_CACHE_TTL = 24 * 3600
+SPEECH_CACHE_MAX_TEXT = 2048
+
+EDGE_TTS_VOICE = os.environ.get("EDGE_TTS_VOICE", "en-US-AriaNeural")
+
+# Whisper infers the container from the upload's file extension
+_UPLOAD_EXTENSIONS = {
+    'audio/wav': 'wav',
+    'audio/wave': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/webm': 'webm'
+}
+
+def get_client(api_key=None):
+    """Return the shared AsyncOpenAI client for an API key.
+
+    Reusing one client keeps its keep-alive connection pool warm across
+    requests. Its connections belong to the background loop in
+    utils.async_runner, so only await it from coroutines running there.
+    """
+    api_key = api_key or os.environ.get('OPENAI_API_KEY')
+    client = _clients.get(api_key)
+    if client is None:
+        if OPENAI_HTTP_BACKEND == 'aiohttp':
+            http_client = DefaultAioHttpClient()
+        else:
+            http_client = httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=300)
+            )
+        client = _clients.setdefault(api_key, AsyncOpenAI(
+            api_key=api_key,
+            http_client=http_client,
+            max_retries=OPENAI_MAX_RETRIES,
+            timeout=OPENAI_TIMEOUT
+        ))
+    return client
+
+async def close_clients():
+    """Close the shared clients and their connection pools."""
+    while _clients:
+        _, client = _clients.popitem()
+        await client.close()
+
+_background_tasks = set()
+
+async def warm_up(api_key=None):
+    """Open a pooled connection to the API before the first user request needs it.
+
+    With WHISPER_BACKEND=local the model is also loaded and run once. That
+    can take far longer than a connection, so it continues in the
+    background rather than holding up startup.
+    """
+    if _local_whisper is not None:
+        task = asyncio.create_task(_local_whisper.warm_up())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    
+    start_time = time.time()
+    async with _api_slots:
+        await get_client(api_key).models.list()
+    log_timing("OpenAI connection warm-up", start_time)
+
 def log_timing(func_name, start_time):
     """Log execution time of a function"""
     duration = time.time() - start_time
-    logger.info(f"{func_name} completed in {duration:.2f} seconds")
+    logger.info("%s completed in %.2f seconds", func_name, duration)
+
+# Transient failures worth another attempt. APIConnectionError covers
+# timeouts; validation errors and other 4xx responses fail immediately.
+RETRYABLE_EXCEPTIONS = (
+    APIConnectionError, RateLimitError, InternalServerError, httpx.TimeoutException, gTTSError, aiohttp.ClientError
+)
+
+def _is_retryable(exc):
+    # The helpers re-raise as plain Exception, so look down the chain for the cause
+    while exc is not None:
+        if isinstance(exc, RETRYABLE_EXCEPTIONS):
+            return True
+        exc = exc.__cause__ or exc.__context__
+    return False
 
 def retry_on_exception(retries=3, delay=1):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            last_exception = None
             for attempt in range(retries):
                 try:
                     return await func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < retries - 1:
-                        print(f"Attempt {attempt + 1} failed, retrying in {delay} seconds...")
-                        time.sleep(delay)
-                    continue
-            raise last_exception
+                    if attempt == retries - 1 or not _is_retryable(e):
+                        raise
+                    # Exponential backoff with jitter so concurrent callers don't retry in lockstep
+                    backoff = delay * (2 ** attempt) + random.uniform(0, 0.25)
+                    logger.warning("%s attempt %d failed, retrying in %.2fs: %s", func.__name__, attempt + 1, backoff, e)
+                    await asyncio.sleep(backoff)
         return wrapper
     return decorator
 
+_CONTENT_TYPE = re.compile(r'^(?P<type>[^;]+)(?:.*?;\s*codecs="?(?P<codec>[^";]+)"?)?')
+
+# (base type, codec) pairs Whisper accepts; '' means no codecs parameter
+_ALLOWED_AUDIO_FORMATS = frozenset({
+    ('audio/wav', ''),
+    ('audio/wave', ''),
+    ('audio/x-wav', ''),
+    ('audio/webm', 'opus')
+})
+_ALLOWED_BASE_TYPES = frozenset(base for base, _ in _ALLOWED_AUDIO_FORMATS)
+
 def validate_audio_format(audio_file):
     """Validate and ensure proper audio format."""
-    allowed_base_types = {
-        'audio/wav': [''],
-        'audio/wave': [''],
-        'audio/x-wav': [''],
-        'audio/webm': ['opus']
-    }
-    
     if not hasattr(audio_file, 'content_type'):
         raise ValueError("Invalid audio file: Missing content type")
     
     # Parse content type and codec
-    content_parts = audio_file.content_type.split(';')
-    base_type = content_parts[0].strip()
-    codec = ''
-    
-    if len(content_parts) > 1:
-        codec_part = [p for p in content_parts[1:] if 'codecs=' in p]
-        if codec_part:
-            codec = codec_part[0].split('=')[1].strip('"')
+    match = _CONTENT_TYPE.match(audio_file.content_type or '')
+    base_type = match['type'].strip() if match else ''
+    codec = (match['codec'] or '').strip() if match else ''
     
     # Validate base type and codec
-    if base_type not in allowed_base_types:
-        supported_formats = [f"{t}{';codecs=' + c if c else ''}" 
-                           for t, codecs in allowed_base_types.items() 
-                           for c in codecs]
+    if base_type not in _ALLOWED_BASE_TYPES:
+        supported_formats = [f"{t}{';codecs=' + c if c else ''}" for t, c in sorted(_ALLOWED_AUDIO_FORMATS)]
         raise ValueError(f"Unsupported audio format: {audio_file.content_type}. "
                         f"Supported formats: {', '.join(supported_formats)}")
     
-    if codec and codec not in allowed_base_types[base_type]:
+    if codec and (base_type, codec) not in _ALLOWED_AUDIO_FORMATS:
         raise ValueError(f"Unsupported codec: {codec} for format {base_type}")
     
     return True
 
+def audio_digest(data):
+    """Return the BLAKE2b digest that identifies uploaded audio by its content."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
 @retry_on_exception(retries=3, delay=1)
 async def process_audio(audio_file, api_key):
     """Process audio file using Whisper API with improved error handling and retries."""
@@ -81,7 +222,7 @@ async def process_audio(audio_file, api_key):
     
     try:
         # Detailed request logging
-        logger.info(f"Audio file details - Size: {audio_file.content_length} bytes, Type: {audio_file.content_type}",
+        logger.info("Audio file details - Size: %s bytes, Type: %s", audio_file.content_length, audio_file.content_type,
                    extra={'request_id': request_id})
         
         # Validate audio format with enhanced logging
@@ -90,186 +231,550 @@ async def process_audio(audio_file, api_key):
         try:
             validate_audio_format(audio_file)
             validation_time = time.time() - validation_start
-            logger.info(f"Audio format validation successful in {validation_time:.2f}s - Format: {audio_file.content_type}",
+            logger.info("Audio format validation successful in %.2fs - Format: %s", validation_time, audio_file.content_type,
                        extra={'request_id': request_id})
         except ValueError as e:
-            logger.error(f"Audio format validation failed: {str(e)}",
+            logger.error("Audio format validation failed: %s", e,
                         extra={'request_id': request_id, 'error_type': 'ValidationError'})
             raise
         
-        logger.info(f"[{request_id}] Initializing OpenAI client...")
-        client = OpenAI(api_key=api_key)
+        client = get_client(api_key)
         
-        # Save the audio file temporarily
-        logger.info(f"[{request_id}] Creating temporary audio file...")
-        temp_start = time.time()
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-            try:
-                audio_file.save(temp_audio.name)
-                file_size = os.path.getsize(temp_audio.name)
-                logger.info(f"[{request_id}] Audio file saved: {file_size} bytes in {time.time() - temp_start:.2f}s")
-                
-                # Transcribe using Whisper API
-                logger.info(f"[{request_id}] Initiating Whisper API request...")
-                transcription_start = time.time()
-                
-                try:
-                    with open(temp_audio.name, 'rb') as audio:
-                        logger.info("Initiating Whisper API request", 
-                                  extra={'request_id': request_id})
-                        
-                        api_start = time.time()
-                        transcript = client.audio.transcriptions.create(
-                            model="whisper-1",
-                            file=audio,
-                            language="en"
-                        )
-                        api_time = time.time() - api_start
-                        
-                        # Log API response details
-                        logger.info(
-                            "Whisper API response received",
-                            extra={
-                                'request_id': request_id,
-                                'api_response_time': f"{api_time:.2f}s",
-                                'text_length': len(transcript.text),
-                                'model': 'whisper-1'
-                            }
-                        )
-                        
-                        # Log text preview with proper truncation
-                        preview = transcript.text[:100] + ('...' if len(transcript.text) > 100 else '')
-                        logger.info(f"Transcribed text preview: {preview}",
-                                  extra={'request_id': request_id})
-                        
-                        # Calculate and log total processing time
-                        total_time = time.time() - start_time
-                        logger.info(
-                            "Audio processing completed",
-                            extra={
-                                'request_id': request_id,
-                                'total_time': f"{total_time:.2f}s",
-                                'transcription_time': f"{api_time:.2f}s"
-                            }
-                        )
-                        return transcript.text
-                    
-                except Exception as e:
-                    error_type = type(e).__name__
-                    error_details = {
-                        'request_id': request_id,
-                        'error_type': error_type,
-                        'error_message': str(e),
-                        'processing_stage': 'whisper_api',
-                        'processing_time': f"{time.time() - api_start:.2f}s"
-                    }
-                    logger.error("Whisper API transcription failed", extra=error_details)
-                    raise Exception(f"Transcription failed ({error_type}): {str(e)}")
-                    
-            except Exception as e:
-                error_type = type(e).__name__
-                error_details = {
+        # Send the upload's bytes straight to Whisper instead of copying them
+        # to a temp file and reading it back. Bytes rather than the stream
+        # itself, so the SDK's own retries re-send the whole upload.
+        audio_file.stream.seek(0)
+        data = audio_file.stream.read()
+        base_type = audio_file.content_type.split(';')[0].strip()
+        upload = (f"audio.{_UPLOAD_EXTENSIONS.get(base_type, 'wav')}", data, base_type)
+        
+        digest = audio_digest(data)
+        cached = _transcripts.get(digest)
+        if cached is not None:
+            logger.info("Serving transcript from audio-content cache", extra={'request_id': request_id})
+            return cached['text']
+        
+        # Transcribe using Whisper API, or the local model when configured
+        logger.info("Initiating Whisper API request", 
+                  extra={'request_id': request_id})
+        api_start = time.time()
+        try:
+            if _local_whisper is not None:
+                transcript_text = await _local_whisper.transcribe(data, language="en")
+            else:
+                async with _api_slots:
+                    transcript = await client.with_options(timeout=TRANSCRIPTION_TIMEOUT).audio.transcriptions.create(
+                        model="whisper-1",
+                        file=upload,
+                        language="en"
+                    )
+                transcript_text = transcript.text
+            api_time = time.time() - api_start
+            
+            # Log API response details
+            logger.info(
+                "Whisper API response received",
+                extra={
                     'request_id': request_id,
-                    'error_type': error_type,
-                    'error_message': str(e),
-                    'processing_stage': 'audio_processing'
+                    'api_response_time': f"{api_time:.2f}s",
+                    'text_length': len(transcript_text),
+                    'model': _local_whisper.model_name if _local_whisper is not None else 'whisper-1'
                 }
-                logger.error("Error in audio processing", extra=error_details)
-                raise
-            finally:
-                # Enhanced cleanup logging
-                cleanup_start = time.time()
-                try:
-                    os.unlink(temp_audio.name)
-                    cleanup_time = time.time() - cleanup_start
-                    logger.info(f"Temporary file cleanup successful in {cleanup_time:.2f}s",
-                              extra={'request_id': request_id})
-                except Exception as e:
-                    logger.warning("Failed to cleanup temporary file",
-                                 extra={
-                                     'request_id': request_id,
-                                     'error_type': type(e).__name__,
-                                     'error_message': str(e)
-                                 })
+            )
+            
+            # Log text preview with proper truncation
+            preview = transcript_text[:100] + ('...' if len(transcript_text) > 100 else '')
+            logger.info("Transcribed text preview: %s", preview,
+                      extra={'request_id': request_id})
+            
+            # Calculate and log total processing time
+            total_time = time.time() - start_time
+            logger.info(
+                "Audio processing completed",
+                extra={
+                    'request_id': request_id,
+                    'total_time': f"{total_time:.2f}s",
+                    'transcription_time': f"{api_time:.2f}s"
+                }
+            )
+            _transcripts.set(digest, {'text': transcript_text}, ttl=TRANSCRIPT_TTL)
+            return transcript_text
+            
+        except Exception as e:
+            error_type = type(e).__name__
+            error_details = {
+                'request_id': request_id,
+                'error_type': error_type,
+                'error_message': str(e),
+                'processing_stage': 'whisper_api',
+                'processing_time': f"{time.time() - api_start:.2f}s"
+            }
+            logger.error("Whisper API transcription failed", extra=error_details)
+            raise Exception(f"Transcription failed ({error_type}): {str(e)}")
                     
     except Exception as e:
-        logger.error(f"[{request_id}] Audio processing failed: {str(e)}")
+        logger.error("[%s] Audio processing failed: %s", request_id, e)
         raise Exception(f"Audio processing failed: {str(e)}")
 
+async def process_audio_array(pcm, sample_rate=16000):
+    """Transcribe float32 mono PCM (e.g. captured with WebAudio) with the local Whisper model.
+
+    Skips the upload and container decoding entirely, so it needs
+    WHISPER_BACKEND=local; the Whisper API only accepts encoded files.
+    """
+    if _local_whisper is None:
+        raise ValueError("Transcribing raw PCM requires WHISPER_BACKEND=local")
+    return await _local_whisper.transcribe_array(pcm, sample_rate, language="en")
+
+# Shared coaching preamble. It is kept byte-for-byte identical across requests
+# and placed first in every prompt so OpenAI's automatic prompt caching, which
+# matches on a stable prefix of at least 1024 tokens, can reuse it each turn.
+# Do not interpolate timestamps or per-user values into it.
+_COACHING_PREAMBLE = """You are a voice-based coaching assistant inside a spoken conversation app. \
+The user talks to you through a microphone, their speech is transcribed automatically, and \
+everything you write is converted to speech and played back to them. Always respond in English.
+
+How your replies are delivered:
+- Your reply is read aloud by a text-to-speech engine, so write the way a person speaks. \
+Use short, complete sentences with natural rhythm.
+- Never use markdown, bullet characters, numbered list syntax, headings, tables, code blocks, \
+emoji, URLs, or any other visual formatting. They are either read out literally or dropped, and \
+both sound wrong. When you need to give several points, introduce them in prose, for example \
+"First, ... Second, ... Finally, ...".
+- Avoid abbreviations and symbols that a speech engine may mispronounce. Write "for example" \
+instead of "e.g.", "and" instead of "&", and "percent" instead of "%". Spell out units.
+- Keep replies brief. Aim for two to five sentences unless the user explicitly asks for more \
+detail. A spoken answer that runs longer than about thirty seconds is hard to follow. If a topic \
+needs more depth, give the most important point first and offer to continue.
+- Do not read back the user's question before answering it. Do not open with filler such as \
+"Great question" or "Certainly". Start with the substance of your answer.
+
+How to handle transcription quality:
+- The user's words come from automatic speech recognition and may contain misheard words, \
+missing punctuation, or fragments. Interpret the most plausible meaning instead of commenting \
+on errors.
+- If the message is too garbled or ambiguous to answer usefully, ask one short clarifying \
+question rather than guessing at length.
+- If the transcript is empty or contains only background noise, politely ask the user to \
+repeat themselves.
+
+How to coach:
+- Be warm, encouraging, and direct. Treat the user as a capable adult who wants practical help.
+- Prefer concrete, actionable suggestions over general principles. When you recommend \
+something, say briefly why it works and how the user can try it today.
+- Ask at most one question per reply, and only when the answer would change your advice or \
+keep the practice going.
+- Build on what the user has already told you in this conversation. Refer back to earlier \
+points when it helps, but do not repeat advice you have already given unless asked.
+- When the user practices something, such as answering an interview question or delivering a \
+difficult message, give specific feedback: one thing that worked well, one thing to improve, \
+and a suggested rephrasing they can say out loud.
+- Encourage the user to practice speaking responses aloud, since this is a voice app and \
+spoken rehearsal builds confidence.
+- Adapt to the user's level. If they seem new to a topic, explain simply. If they are \
+experienced, skip the basics and go deeper.
+- Stay positive about setbacks. Normalize nervousness, mistakes, and slow progress, and \
+frame them as part of learning.
+
+Boundaries and safety:
+- You are a coach, not a doctor, therapist, lawyer, or financial advisor. For medical, \
+psychological, legal, or financial questions beyond general guidance, recommend that the user \
+consult a qualified professional, and keep your own input general.
+- If the user expresses thoughts of self-harm, harming others, or being in danger, respond \
+with care, encourage them to contact local emergency services or a crisis line right away, \
+and do not continue ordinary coaching in that reply.
+- Do not invent facts about specific companies, people, or statistics. If you are unsure, \
+say so plainly and suggest how the user could find out.
+- Do not claim to remember anything outside the current conversation, do not claim to have \
+a body or personal experiences, and do not pretend to take actions outside this chat.
+- Politely decline requests that are hateful, harassing, sexually explicit, or designed to \
+deceive or harm others, and steer back to constructive coaching.
+- Respect privacy. Do not ask for sensitive personal information such as passwords, \
+identification numbers, or financial account details.
+
+Conversation style:
+- Sound like a supportive human coach speaking in person: natural, calm, and confident.
+- Use the second person and speak directly to the user.
+- Vary your sentence openings so consecutive replies do not sound repetitive.
+- End when your point is made. A short question that invites the next step is welcome, but a \
+closing summary of what you just said is not.
+- If the user changes topic, follow them without commenting on the change.
+- If the user thanks you or says goodbye, reply briefly and warmly.
+
+Your specific coaching focus for this conversation is described below. Stay within it, and if \
+the user asks about something clearly outside it, help briefly and then relate it back to \
+your focus where natural.
+
+"""
+
+_CATEGORY_FOCUS = {
+    'soft_skills': "You are an expert in soft skills and communication coaching.",
+    'interview': "You are an experienced interview coach and career counselor.",
+    'personality': "You are a personality development coach focusing on personal growth.",
+    'general': "You are a helpful life coach providing general advice and guidance."
+}
+
+# Read-only so nothing can alter the cached prefix at runtime
+STATIC_SYSTEM_PREFIX = MappingProxyType({
+    category: _COACHING_PREAMBLE + focus for category, focus in _CATEGORY_FOCUS.items()
+})
+
+SYSTEM_MESSAGES = MappingProxyType({
+    category: {"role": "system", "content": prompt} for category, prompt in STATIC_SYSTEM_PREFIX.items()
+})
+
+CATEGORY_MODELS = {
+    category: os.environ.get(f"CHAT_MODEL_{category.upper()}", CHAT_MODEL) for category in _CATEGORY_FOCUS
+}
+
+# Output caps sized to each category's typical spoken reply. The API reserves
+# generation capacity for the cap, so a tighter one starts and ends sooner.
+CATEGORY_MAX_TOKENS = MappingProxyType({
+    'interview': 200,
+    'soft_skills': 120,
+    'personality': 120,
+    'general': 96
+})
+
+def max_output_tokens(category):
+    """Return the output token cap for a coaching category."""
+    return CATEGORY_MAX_TOKENS.get(category, CATEGORY_MAX_TOKENS['general'])
+
+def chat_model(category):
+    """Return the chat model used for a coaching category."""
+    return CATEGORY_MODELS.get(category, CHAT_MODEL)
+
+def system_prompt(category):
+    """Return the static system prompt for a coaching category."""
+    return STATIC_SYSTEM_PREFIX.get(category, STATIC_SYSTEM_PREFIX['general'])
+
+def build_messages(text, category, history):
+    """Build the chat messages with the static system prefix first and the new turn last."""
+    system = SYSTEM_MESSAGES.get(category, SYSTEM_MESSAGES['general'])
+    return [system, *history, {"role": "user", "content": text}]
+
+def _reply_request(category, model=None, **overrides):
+    return {
+        'model': model or chat_model(category),
+        'instructions': system_prompt(category),
+        'temperature': 0.7,
+        'max_output_tokens': max_output_tokens(category),
+        # A long previous_response_id chain drops its oldest turns instead of
+        # failing with a context-length error
+        'truncation': 'auto',
+        **overrides
+    }
+
+class RequestRateLimiter:
+    """Space request starts so no more than ``rpm`` begin per minute."""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds):
+        """Hold back every caller for ``seconds``, e.g. after a 429."""
+        self._next_start = max(self._next_start, time.monotonic() + seconds)
+
+def _retry_after(exc, default=1.0):
+    try:
+        return float(exc.response.headers.get('retry-after', default))
+    except (AttributeError, TypeError, ValueError):
+        return default
+
+# Optional process-wide start rate for replies. Set OPENAI_CHAT_RPM to the
+# account's RPM divided by the number of worker processes; a 429 then
+# pauses every caller for the Retry-After interval instead of letting each
+# one retry into the limit.
+OPENAI_CHAT_RPM = int(os.environ.get("OPENAI_CHAT_RPM", 0))
+_reply_rate = RequestRateLimiter(OPENAI_CHAT_RPM) if OPENAI_CHAT_RPM > 0 else None
+
+async def _create_reply(client, request, user_turn, history, previous_response_id=None):
+    """Call the Responses API, continuing ``previous_response_id`` when it still exists."""
+    if _reply_rate is not None:
+        await _reply_rate.wait()
+    try:
+        async with _api_slots:
+            if previous_response_id:
+                try:
+                    return await client.responses.create(
+                        **request,
+                        input=[user_turn],
+                        previous_response_id=previous_response_id
+                    )
+                except NotFoundError:
+                    logger.warning("Previous response %s not found, resending history", previous_response_id)
+            return await client.responses.create(**request, input=[*history, user_turn])
+    except RateLimitError as e:
+        if _reply_rate is not None:
+            _reply_rate.pause(_retry_after(e))
+        raise
+
 @retry_on_exception(retries=3, delay=1)
-async def generate_response(text, category, history, api_key):
-    """Generate response using GPT with improved error handling and retries."""
+async def generate_response(text, category, history, api_key, previous_response_id=None, model=None):
+    """Generate response using GPT with improved error handling and retries.
+
+    Uses the Responses API. When ``previous_response_id`` is given, only the
+    new user turn is sent and OpenAI continues the stored conversation, so
+    earlier turns are not re-sent or prefilled again. Otherwise, or when that
+    response has expired, the session history is sent in full.
+
+    ``model`` overrides the category's default model, e.g. to escalate a
+    turn to ``gpt-4o``.
+
+    Returns a ``(response_text, response_id)`` tuple.
+    """
     try:
-        client = OpenAI(api_key=api_key)
-        
-        # Create system message based on category
-        system_messages = {
-            'soft_skills': "You are an expert in soft skills and communication coaching. Always respond in English.",
-            'interview': "You are an experienced interview coach and career counselor. Always respond in English.",
-            'personality': "You are a personality development coach focusing on personal growth. Always respond in English.",
-            'general': "You are a helpful life coach providing general advice and guidance. Always respond in English."
-        }
-        
-        messages = [
-            {"role": "system", "content": system_messages.get(category, system_messages['general'])}
-        ]
-        
-        # Add conversation history
-        for msg in history:
-            messages.append(msg)
-            
-        # Add current user message
-        messages.append({"role": "user", "content": text})
+        client = get_client(api_key)
+        user_turn = {"role": "user", "content": text}
+        request = _reply_request(category, model)
         
         try:
-            # Generate response using GPT-4
-            response = client.chat.completions.create(
-                model="gpt-4",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150
-            )
-            
-            return response.choices[0].message.content
+            response = await _create_reply(client, request, user_turn, history, previous_response_id)
+            return response.output_text, response.id
         except Exception as e:
             raise Exception(f"GPT response generation failed: {str(e)}")
             
     except Exception as e:
         raise Exception(f"Error generating response: {str(e)}")
 
-@retry_on_exception(retries=3, delay=1)
+async def generate_responses_batch(items, api_key, rpm=200, max_concurrent=8):
+    """Generate replies for many ``(text, category, history)`` items concurrently.
+
+    Intended for offline jobs such as cache warming. At most
+    ``max_concurrent`` replies are in flight and at most ``rpm`` start per
+    minute. Returns a list in input order holding ``(response_text,
+    response_id)`` tuples, or the exception an item failed with.
+    """
+    slots = asyncio.Semaphore(max_concurrent)
+    limiter = RequestRateLimiter(rpm)
+    
+    async def generate(text, category, history):
+        async with slots:
+            await limiter.wait()
+            return await generate_response(text, category, history, api_key)
+    
+    return await asyncio.gather(
+        *(generate(text, category, history) for text, category, history in items),
+        return_exceptions=True
+    )
+
+async def stream_response(text, category, history, api_key):
+    """Yield GPT response text deltas as they are generated."""
+    client = get_client(api_key)
+    messages = build_messages(text, category, history)
+    
+    try:
+        if _reply_rate is not None:
+            await _reply_rate.wait()
+        try:
+            async with _api_slots:
+                stream = await client.chat.completions.create(
+                    model=chat_model(category),
+                    messages=messages,
+                    temperature=0.7,
+                    max_tokens=max_output_tokens(category),
+                    stream=True
+                )
+        except RateLimitError as e:
+            if _reply_rate is not None:
+                _reply_rate.pause(_retry_after(e))
+            raise
+        # Closed on exit so an abandoned reply releases its HTTP/2 stream now, not at GC
+        async with stream:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+    except Exception as e:
+        raise Exception(f"GPT response streaming failed: {str(e)}")
+
+async def iter_sentences(tokens):
+    """Regroup a stream of text deltas into complete sentences.
+
+    Closing this generator also closes ``tokens``.
+    """
+    buffer = ''
+    async with aclosing(tokens):
+        async for token in tokens:
+            buffer += token
+            match = _SENTENCE_END.search(buffer)
+            while match:
+                sentence, buffer = buffer[:match.end()].strip(), buffer[match.end():]
+                if sentence:
+                    yield sentence
+                match = _SENTENCE_END.search(buffer)
+    if buffer.strip():
+        yield buffer.strip()
+
+def audio_data_url(audio):
+    """Wrap MP3 bytes in a base64 data URL for transports that only carry text."""
+    return f"data:audio/mp3;base64,{base64.b64encode(audio).decode('ascii')}"
+
+class _SharedSession(requests.Session):
+    """A Session that stays open when gTTS leaves its ``with`` block."""
+
+    def __exit__(self, *args):
+        pass
+
+class _SharedSessionRequests:
+    """Stand-in for the ``requests`` module inside gtts.tts.
+
+    gTTS opens a new Session, and so a new TLS connection, for every
+    request; handing it one pooled Session lets synthesis reuse
+    keep-alive connections to Google across calls and threads.
+    """
+
+    def __init__(self, session):
+        self._session = session
+
+    def Session(self):
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+_gtts_session = _SharedSession()
+_gtts_session.mount('https://', HTTPAdapter(pool_connections=8, pool_maxsize=32))
+gtts.tts.requests = _SharedSessionRequests(_gtts_session)
+
+def _gtts_synthesize(text):
+    tts = gTTS(text=text, lang='en')
+    
+    # Save to bytes buffer
+    fp = io.BytesIO()
+    tts.write_to_fp(fp)
+    fp.seek(0)
+    return fp
+
 async def text_to_speech(text, voice_model='default'):
+    """Convert text to speech, reusing the audio of recently spoken sentences. Returns MP3 bytes."""
+    if len(text) > SPEECH_CACHE_MAX_TEXT:
+        return await _synthesize_speech(text, voice_model)
+    
+    key = hashlib.blake2b(f"{voice_model}\0{text}".encode(), digest_size=16).hexdigest()
+    cached = _speech.get(key)
+    if cached is not None:
+        return cached['audio']
+    audio = await _synthesize_speech(text, voice_model)
+    _speech.set(key, {'audio': audio}, ttl=SPEECH_CACHE_TTL)
+    return audio
+
+@retry_on_exception(retries=3, delay=1)
+async def _synthesize_speech(text, voice_model):
     """Convert text to speech with improved error handling and retries."""
     try:
         if voice_model == 'openai':
             try:
-                client = OpenAI(api_key=os.environ.get('OPENAI_API_KEY'))
-                response = client.audio.speech.create(
-                    model="tts-1",
-                    voice="alloy",  # Default OpenAI voice
-                    input=text,
-                )
+                client = get_client()
+                async with _api_slots:
+                    response = await client.audio.speech.create(
+                        model="tts-1",
+                        voice="alloy",  # Default OpenAI voice
+                        input=text,
+                        response_format="mp3",  # Segments are joined and served as audio/mpeg
+                    )
                 
-                audio_data = response.content
-                audio_base64 = base64.b64encode(audio_data).decode()
-                return f"data:audio/mp3;base64,{audio_base64}"
+                return response.content
             except Exception as e:
                 raise Exception(f"OpenAI TTS failed: {str(e)}")
-        else:
-            # Using gTTS for default text-to-speech conversion
-            tts = gTTS(text=text, lang='en')
-            
-            # Save to bytes buffer
-            fp = io.BytesIO()
-            tts.write_to_fp(fp)
-            fp.seek(0)
-            
-            # Convert to base64 for frontend playback
+        elif voice_model == 'edge':
+            # Microsoft Edge's neural voices over an async websocket; MP3 by default
             try:
-                audio_base64 = base64.b64encode(fp.read()).decode()
-                return f"data:audio/mp3;base64,{audio_base64}"
+                communicate = edge_tts.Communicate(text, EDGE_TTS_VOICE)
+                chunks = [chunk['data'] async for chunk in communicate.stream() if chunk['type'] == 'audio']
+                return b''.join(chunks)
             except Exception as e:
-                raise Exception(f"Audio encoding failed: {str(e)}")
+                raise Exception(f"Edge TTS failed: {str(e)}")
+        else:
+            # Using gTTS for default text-to-speech conversion. It makes
+            # blocking HTTP calls, so keep it off the shared event loop.
+            fp = await asyncio.to_thread(_gtts_synthesize, text)
+            return fp.getvalue()
             
     except Exception as e:
         raise Exception(f"Text-to-speech conversion failed: {str(e)}")
+
+@retry_on_exception(retries=3, delay=1)
+async def embed_text(text, api_key, model="text-embedding-3-small"):
+    """Embed text for semantic cache lookups."""
+    try:
+        client = get_client(api_key)
+        async with _api_slots:
+            response = await client.embeddings.create(model=model, input=text)
+        return response.data[0].embedding
+    except Exception as e:
+        raise Exception(f"Embedding generation failed: {str(e)}")
+
+@retry_on_exception(retries=3, delay=1)
+async def _open_reply_stream(client, request, user_turn, history, previous_response_id=None):
+    """Open a streamed reply. Only this step is retried, so a TTS failure never re-runs GPT."""
+    return await _create_reply(client, request, user_turn, history, previous_response_id)
+
+async def generate_spoken_response(text, category, history, api_key, previous_response_id=None,
+                                   voice_model='default', model=None):
+    """Generate a reply and its speech as one overlapping pipeline.
+
+    The Responses API reply is streamed, and each sentence is handed to
+    text_to_speech as soon as it is complete, so synthesis of the opening
+    sentences runs while GPT is still writing the rest. The MP3 segments are
+    joined in order; MP3 frames concatenate into a playable stream.
+
+    If the reply is cut off by max_output_tokens, its unfinished last
+    sentence is dropped rather than spoken, unless it is the whole reply.
+    A failed or empty reply raises instead of returning silent audio.
+
+    Returns a ``(response_text, response_id, audio)`` tuple.
+    """
+    client = get_client(api_key)
+    user_turn = {"role": "user", "content": text}
+    reply = {'id': None, 'incomplete': False}
+    tts_tasks = []
+
+    async def deltas(stream):
+        async for event in stream:
+            if event.type == 'response.output_text.delta':
+                yield event.delta
+            elif event.type == 'response.created':
+                # Taken here rather than on response.completed so a truncated
+                # reply (response.incomplete) still chains previous_response_id.
+                reply['id'] = event.response.id
+            elif event.type == 'response.incomplete':
+                reply['incomplete'] = True
+            elif event.type == 'response.failed':
+                error = event.response.error
+                raise Exception(f"Response failed: {error.message if error else 'unknown error'}")
+            elif event.type == 'error':
+                raise Exception(f"Response stream error: {event.message}")
+
+    try:
+        stream = await _open_reply_stream(
+            client, _reply_request(category, model, stream=True), user_turn, history, previous_response_id
+        )
+        async with stream:
+            sentences = []
+            async for sentence in iter_sentences(deltas(stream)):
+                sentences.append(sentence)
+                tts_tasks.append(asyncio.create_task(text_to_speech(sentence, voice_model)))
+        if reply['incomplete'] and len(sentences) > 1 and not sentences[-1].endswith(('.', '?', '!')):
+            sentences.pop()
+            tts_tasks.pop().cancel()
+        if not sentences:
+            raise Exception("Reply contained no text to speak")
+        segments = await asyncio.gather(*tts_tasks)
+    except Exception as e:
+        raise Exception(f"Spoken response generation failed: {str(e)}")
+    finally:
+        # Also covers cancellation, which the except clause does not see
+        for task in tts_tasks:
+            task.cancel()
+
+    return ' '.join(sentences), reply['id'], b''.join(segments)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import threading
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+EMBEDDING_DIM = 1536
+DEFAULT_THRESHOLD = 0.92
+HISTORY_WINDOW = 4
+# 10k unit vectors of 1536 float32 is about 60MB of matrix per worker process
+DEFAULT_MAX_ENTRIES = 10000
+
+def context_key(category, history, window=HISTORY_WINDOW):
+    """Hash the category and the tail of the conversation that conditions a reply."""
+    payload = {'category': category, 'history': history[-window:] if window else []}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def normalize_embedding(embedding):
+    """Return the embedding as a unit-length float32 vector."""
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vector)
+    if norm == 0:
+        raise ValueError("Cannot cache a zero-length embedding")
+    return vector / norm
+
+class SemanticCache:
+    """In-process cache of assistant replies looked up by embedding similarity.
+
+    Embeddings are stored unit-normalized in one contiguous float32 matrix, so a
+    lookup is a single matrix-vector product followed by a mask on the
+    conversation context. Entries are persisted to the ``semantic_cache`` table;
+    rows stored without an embedding are backfilled by ``flask warm-cache``.
+    At most ``max_entries`` are held in memory; beyond that the oldest entry
+    is overwritten, and each insert trims the table to the newest
+    ``max_entries`` rows, so neither the index nor the table grows without bound.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, dim=EMBEDDING_DIM, max_entries=DEFAULT_MAX_ENTRIES,
+                 initial_capacity=256):
+        self.threshold = threshold
+        self.dim = dim
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        capacity = min(initial_capacity, max_entries)
+        self._matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self._contexts = np.zeros(capacity, dtype=np.int64)
+        self._size = 0
+        self._oldest = 0
+        self._responses = []
+        self._row_ids = []
+
+    def __len__(self):
+        return self._size
+
+    @staticmethod
+    def _context_id(key):
+        # The leading 60 bits of the sha256 key, so no per-context table is kept
+        return int(key[:15], 16)
+
+    def _append(self, vector, key, response, row_id):
+        if self._size < self.max_entries:
+            if self._size == len(self._matrix):
+                capacity = min(max(1, len(self._matrix)) * 2, self.max_entries)
+                matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+                matrix[:self._size] = self._matrix[:self._size]
+                contexts = np.zeros(capacity, dtype=np.int64)
+                contexts[:self._size] = self._contexts[:self._size]
+                self._matrix, self._contexts = matrix, contexts
+            slot = self._size
+            self._responses.append(response)
+            self._row_ids.append(row_id)
+            self._size += 1
+        else:
+            slot = self._oldest
+            self._oldest = (slot + 1) % self.max_entries
+            self._responses[slot] = response
+            self._row_ids[slot] = row_id
+
+        self._matrix[slot] = vector
+        self._contexts[slot] = self._context_id(key)
+
+    def load(self):
+        """Populate the in-memory index from the database. Requires an app context."""
+        from models import SemanticCacheEntry
+
+        newest = (SemanticCacheEntry.query
+                  .filter(SemanticCacheEntry.embedding.isnot(None))
+                  .order_by(SemanticCacheEntry.id.desc())
+                  .limit(self.max_entries)
+                  .all())
+        with self._lock:
+            for entry in reversed(newest):
+                vector = np.frombuffer(entry.embedding, dtype=np.float32)
+                if vector.shape[0] != self.dim:
+                    logger.warning("Skipping semantic cache entry %s with dimension %s", entry.id, vector.shape[0])
+                    continue
+                self._append(vector, entry.context_key, entry.response, entry.id)
+        logger.info("Semantic cache loaded with %s entries", self._size)
+
+    def lookup(self, embedding, key):
+        """Return the cached response closest to ``embedding`` within context ``key``, or None."""
+        vector = normalize_embedding(embedding)
+        with self._lock:
+            if self._size == 0:
+                return None
+            context_id = self._context_id(key)
+            scores = self._matrix[:self._size] @ vector
+            scores[self._contexts[:self._size] != context_id] = -1.0
+            best = int(np.argmax(scores))
+            score = float(scores[best])
+            if score < self.threshold:
+                return None
+            response, row_id = self._responses[best], self._row_ids[best]
+
+        logger.info("Semantic cache hit (similarity %.3f)", score)
+        self._record_hit(row_id)
+        return response
+
+    def insert(self, embedding, key, category, text, response):
+        """Add a response to the index and persist it. Requires an app context.
+
+        ``embedding`` may be None, in which case the entry is only persisted
+        and becomes searchable once ``flask warm-cache`` has embedded it.
+        """
+        from app import db
+        from models import SemanticCacheEntry
+
+        vector = normalize_embedding(embedding) if embedding is not None else None
+        entry = SemanticCacheEntry(
+            category=category,
+            context_key=key,
+            text=text,
+            embedding=vector.tobytes() if vector is not None else None,
+            response=response
+        )
+        db.session.add(entry)
+        db.session.flush()
+        cutoff = (db.session.query(SemanticCacheEntry.id)
+                  .order_by(SemanticCacheEntry.id.desc())
+                  .offset(self.max_entries)
+                  .limit(1)
+                  .scalar())
+        if cutoff is not None:
+            SemanticCacheEntry.query.filter(SemanticCacheEntry.id <= cutoff).delete(synchronize_session=False)
+        db.session.commit()
+
+        if vector is not None:
+            with self._lock:
+                self._append(vector, key, response, entry.id)
+
+    def _record_hit(self, row_id):
+        from app import db
+        from models import SemanticCacheEntry
+
+        try:
+            SemanticCacheEntry.query.filter_by(id=row_id).update(
+                {SemanticCacheEntry.hits: SemanticCacheEntry.hits + 1}
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning("Failed to record semantic cache hit: %s", e)
@@ -0,0 +1,60 @@
+import asyncio
+import hashlib
+import logging
+
+import boto3
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+class TTSObjectStore:
+    """Content-addressed store of synthesized replies in S3 (or an S3-compatible service).
+
+    Audio is keyed by ``sha256(text + voice_model)``, so an utterance is
+    synthesized once and then served to every client from the bucket or its
+    CDN through a presigned URL.
+    """
+
+    def __init__(self, bucket, prefix='tts/', url_ttl=3600, endpoint_url=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.url_ttl = url_ttl
+        self._s3 = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def key_for(self, text, voice_model):
+        digest = hashlib.sha256((text + voice_model).encode()).hexdigest()
+        return f"{self.prefix}{digest}.mp3"
+
+    def _exists(self, key):
+        try:
+            self._s3.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def _put(self, key, audio):
+        self._s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=audio,
+            ContentType='audio/mpeg',
+            CacheControl='public, max-age=31536000, immutable'
+        )
+
+    def _presign(self, key):
+        return self._s3.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=self.url_ttl
+        )
+
+    async def speech_url(self, text, voice_model, synthesize):
+        """Return a presigned URL for the reply, calling ``synthesize`` only if it isn't stored yet."""
+        key = self.key_for(text, voice_model)
+        if not await asyncio.to_thread(self._exists, key):
+            audio = await synthesize(text, voice_model)
+            await asyncio.to_thread(self._put, key, audio)
+            logger.info("Stored synthesized reply at %s (%s bytes)", key, len(audio))
+        return self._presign(key)